@@ -15,6 +15,9 @@ The main components are the mp3hash function and the TaggedFile class.
   seek and negative values for seek and will parse all the sizes
   for the metadata stored within it.
 
+* TagLayout class holds those sizes as a small immutable value,
+  which can be pickled or packed into a fixed width binary string.
+
 Technical details:
 ~~~~~~~~~~~~~~~~~~
 
@@ -35,50 +38,369 @@ Based on id3v2 docs: http://www.id3.org/id3v2.3.0
 Javier Santacruz 2012-06-03
 """
 
+import os
+import re
+import sys
+import zlib
+import time
+import heapq
 import struct
 import hashlib
+import tempfile
+import threading
 from collections import deque
-from itertools import repeat, chain
+from functools import partial
+from operator import itemgetter
+from itertools import repeat, chain, islice
 
 
-def mp3hash(path, maxbytes=None, hasher=None):
+def mp3hash(path, maxbytes=None, hasher=None, checkpoints=None,
+            layout=None, hooks=None):
     """Returns the hash of the sound contents of a ID3 tagged file
     Convenience function which wraps TaggedFile
     Returns None on failure
+
+    hasher is a hasher object or the name of a registered one. See HASHERS.
+    If checkpoints are given, returns a list of hashes instead. See hashfile.
+    A TagLayout previously parsed for the file can be given as layout.
+    hooks is a list of Hook objects to use instead of the global HOOKS.
     """
     if maxbytes is not None and maxbytes <= 0:
         raise ValueError(u'maxbytes must be a positive integer')
 
+    if checkpoints is not None and any(n <= 0 for n in checkpoints):
+        raise ValueError(u'checkpoints must be positive integers')
+
     if hasher is None:
         hasher = hashlib.new('sha1')
+    elif isinstance(hasher, basestring):
+        hasher = new_hasher(hasher)
+
+    if hooks is None:
+        hooks = HOOKS
 
     with open(path, 'rb') as ofile:
-        return TaggedFile(ofile).hash(maxbytes=maxbytes, hasher=hasher)
+        try:
+            for hook in hooks:
+                hook.file_open(ofile)
+
+            tagged = TaggedFile(ofile, layout)
+        except BaseException:
+            # TaggedFile.hash won't be reached to end the hooks
+            end_hooks(hooks, ofile, None)
+            raise
+
+        return tagged.hash(maxbytes=maxbytes, hasher=hasher,
+                           checkpoints=checkpoints, hooks=hooks)
+
+
+def two_tier_hash(paths, fast='crc32', strong='sha1', maxbytes=None):
+    """Returns a list of (path, hash) for the given paths
+
+    Every file is hashed with the fast hasher, and only those sharing their
+    fast hash with any other are hashed again with the strong one. See
+    verify_collisions.
+    """
+    return verify_collisions(
+        [(path, mp3hash(path, maxbytes=maxbytes, hasher=fast))
+         for path in paths],
+        strong, maxbytes)
+
+
+def verify_collisions(hashes, hasher='sha1', maxbytes=None,
+                      hash_function=None):
+    """Confirms the colliding hashes in a list of (path, hash)
+
+    Returns a new list of (path, hash) where the hash of every path sharing
+    it with any other is replaced by 'hash:strong hash', computed using
+    the named hasher. Unique hashes are left untouched.
+
+    hash_function, if given, takes a path and returns its strong hash,
+    instead of calling mp3hash with hasher and maxbytes.
+    """
+    if hash_function is None:
+        hash_function = partial(mp3hash, maxbytes=maxbytes, hasher=hasher)
+
+    collisions = colliding_hashes(hashes)
+
+    return [
+        (path, hash if hash not in collisions else
+         hash + ':' + hash_function(path))
+        for path, hash in hashes
+    ]
+
+
+def colliding_hashes(hashes):
+    "Returns the set of hashes shared by several paths in a list of (path, hash)"
+    counts = {}
+    for path, hash in hashes:
+        counts[hash] = counts.get(hash, 0) + 1
+
+    return set(hash for hash, count in counts.items() if count > 1)
 
 
-def hashfile(file, start, end, hasher, maxbytes=None, blocksize=2 ** 19):
+def hashfile(file, start, end, hasher, maxbytes=None, blocksize=2 ** 19,
+             checkpoints=None, hooks=None):
     """Hashes an open file data starting from byte 'start' to the byte 'end'
     max is the maximum amount of data to hash, in bytes.
     The hexdigest string is calculated considering only bytes between start,end
     default block size is 512 KiB
+
+    checkpoints is a list of byte counts. If given, the data is read once and
+    a list is returned with the hexdigest of the first n bytes for each of
+    them, in ascending order, followed by the hexdigest of the whole data.
+    Counts beyond the data size get the whole data hexdigest. The hasher must
+    support the copy method.
+
+    The block method of the given hooks is called after hashing each block.
     """
     if maxbytes is not None and maxbytes > 0:
         end = min(end, start + maxbytes)
 
     read, update = file.read, hasher.update  # Operations
 
+    if hooks:
+        update = hooked_update(file, update, hooks)
+
     size = end - start
+
+    file.seek(start)  # jump headers
+
+    if checkpoints is None:
+        consume(update(read(size)) for size in blocksizes(size, blocksize))
+        return hasher.hexdigest()
+
+    hashes, position = [], 0
+    for offset in sorted(checkpoints):
+        if offset >= size:
+            break
+
+        consume(update(read(n))
+                for n in blocksizes(offset - position, blocksize))
+        hashes.append(hasher.copy().hexdigest())
+        position = offset
+
+    consume(update(read(n)) for n in blocksizes(size - position, blocksize))
+    hexdigest = hasher.hexdigest()
+
+    return hashes + [hexdigest] * (len(checkpoints) + 1 - len(hashes))
+
+
+def end_hooks(hooks, file, hash):
+    "Calls file_done on every hook, even if some of them raise"
+    if hooks:
+        try:
+            hooks[0].file_done(file, hash)
+        finally:
+            end_hooks(hooks[1:], file, hash)
+
+
+def hooked_update(file, update, hooks):
+    "Wraps a hasher update method to notify the hooks of every block"
+    def wrapper(data):
+        update(data)
+        for hook in hooks:
+            hook.block(file, len(data))
+
+    return wrapper
+
+
+def blocksizes(size, blocksize):
+    """ Splits size in blocks of blocksize bytes plus a smaller spare block """
     nblocks = size // blocksize
     spare_block_size = size % blocksize
 
-    blocksizes = repeat(blocksize, nblocks)
+    sizes = repeat(blocksize, nblocks)
     if spare_block_size:
-        blocksizes = chain(blocksizes, [spare_block_size])
+        sizes = chain(sizes, [spare_block_size])
 
-    file.seek(start)  # jump headers
-    consume(update(read(size)) for size in blocksizes)
+    return sizes
+
+
+class ChecksumHasher(object):
+    """Adapts a zlib running checksum function to the hasher protocol
+
+    Subclasses set the checksum function and its initial value.
+    """
+    checksum = None
+    initial = 0
+    digest_size = 4
+
+    def __init__(self, value=None):
+        self.value = self.initial if value is None else value
+
+    def update(self, data):
+        self.value = self.checksum(data, self.value) & 0xffffffff
+
+    def hexdigest(self):
+        return '{0:08x}'.format(self.value)
+
+    def copy(self):
+        return type(self)(self.value)
+
+
+class Crc32Hasher(ChecksumHasher):
+    name = 'crc32'
+    checksum = staticmethod(zlib.crc32)
+    initial = 0
+
+
+class Adler32Hasher(ChecksumHasher):
+    name = 'adler32'
+    checksum = staticmethod(zlib.adler32)
+    initial = 1
 
-    return hasher.hexdigest()
+
+# hashlib.algorithms was included in python 2.7
+HASHLIB_ALGORITHMS = getattr(
+    hashlib,
+    'algorithms',
+    ('md5', 'sha1', 'sha224', 'sha256', 'sha384', 'sha512')
+)
+
+# hasher factories by name, shared by the API and the command line
+HASHERS = dict((name, partial(hashlib.new, name))
+               for name in HASHLIB_ALGORITHMS)
+HASHERS.update(crc32=Crc32Hasher, adler32=Adler32Hasher)
+
+
+def register_hasher(name, factory):
+    """Makes a hasher available by name. factory must take no arguments
+    and return an object following the update/hexdigest protocol
+    """
+    HASHERS[name] = factory
+
+
+def new_hasher(name):
+    "Returns a new hasher registered with the given name"
+    factory = HASHERS.get(name)
+    if factory is None:
+        raise ValueError(u"Unknown '{0}' algorithm".format(name))
+
+    return factory()
+
+
+def algorithms():
+    "Returns the sorted names of the registered hashers"
+    return sorted(HASHERS)
+
+
+class Hook(object):
+    """Receives the events of the hashing of files
+
+    Subclasses override the events they are interested in. Events receive
+    the open file being hashed, and are called in this order:
+
+    * file_open: the file has been opened by mp3hash.
+    * tag_probe: the tags have been parsed, giving the music limits.
+    * block: a block of the given size has been read and hashed.
+    * file_done: the file has been hashed, giving the result, or None if
+      hashing or any hook failed. It is always called after any of the
+      other events, even to the hooks which didn't get them due to a
+      previous hook failing.
+
+    file_open is only called through mp3hash, not by TaggedFile.hash.
+    """
+
+    def file_open(self, file):
+        pass
+
+    def tag_probe(self, file, music_limits):
+        pass
+
+    def block(self, file, size):
+        pass
+
+    def file_done(self, file, hash):
+        pass
+
+
+class ProfileHook(Hook):
+    """Profiles the hashing of every file with cProfile
+
+    The profiler only sees the thread which opened the file.
+    Use print_stats or the stats attribute to see the results.
+    """
+
+    def __init__(self):
+        import cProfile
+        self.profile = cProfile.Profile()
+
+    def file_open(self, file):
+        self.profile.enable()
+
+    def tag_probe(self, file, music_limits):
+        self.profile.enable()
+
+    def file_done(self, file, hash):
+        self.profile.disable()
+
+    @property
+    def stats(self):
+        import pstats
+        return pstats.Stats(self.profile)
+
+    def print_stats(self, sort='cumulative', limit=20):
+        self.stats.sort_stats(sort).print_stats(limit)
+
+
+class TracemallocHook(Hook):
+    """Records the memory allocated while hashing every file
+
+    Requires the tracemalloc module, which is started if not tracing yet.
+    The results attribute holds a (name, size, peak) tuple for each file,
+    with the size still allocated and the peak traced memory, in bytes.
+    The peak is reset for every file where tracemalloc.reset_peak exists.
+    """
+
+    def __init__(self):
+        try:
+            import tracemalloc
+        except ImportError:
+            raise ImportError(u'TracemallocHook requires tracemalloc')
+
+        self.tracemalloc = tracemalloc
+        self.results = []
+        self.started = {}
+
+    def file_open(self, file):
+        if file in self.started:
+            return
+
+        if not self.tracemalloc.is_tracing():
+            self.tracemalloc.start()
+
+        self.started[file] = self.tracemalloc.get_traced_memory()[0]
+
+        reset_peak = getattr(self.tracemalloc, 'reset_peak', None)
+        if reset_peak is not None:
+            reset_peak()
+
+    def tag_probe(self, file, music_limits):
+        self.file_open(file)
+
+    def file_done(self, file, hash):
+        if file not in self.started:
+            return
+
+        started = self.started.pop(file)
+        size, peak = self.tracemalloc.get_traced_memory()
+        self.results.append(
+            (getattr(file, 'name', repr(file)), size - started, peak))
+
+
+# hooks used when none are given to mp3hash or TaggedFile.hash
+HOOKS = []
+
+
+def register_hook(hook):
+    "Adds a hook to be used by every mp3hash and TaggedFile.hash call"
+    HOOKS.append(hook)
+
+
+def unregister_hook(hook):
+    "Removes a hook previously registered with register_hook"
+    HOOKS.remove(hook)
 
 
 def consume(iterator):
@@ -87,15 +409,6 @@ def consume(iterator):
     deque(iterator, maxlen=0)
 
 
-def memento(function):
-    def wrapper(self):
-        attr_name = '_' + function.__name__ + '_value'
-        if not hasattr(self, attr_name):
-            setattr(self, attr_name, function(self))
-        return getattr(self, attr_name)
-    return wrapper
-
-
 def parse_7bitint(bytes, bits=7, mask=(1 << 7) - 1):
     """ Parses a big endian integer from a list of bytes
     taking only the first 7 bits from each byte
@@ -128,137 +441,622 @@ ID3V2_HEADER_SIZE = 10
 ID3V2_FOOTER_SIZE = 10
 
 
-class TaggedFile(object):
+class TagLayout(object):
+    """Sizes and offsets of the tags in a file
 
-    def __init__(self, file):
-        self.file = file
-        self.file.seek(0, 2)  # end of file
-        self.filesize = self.file.tell()
+    Immutable. Use TagLayout.parse to read it from a file-like object
+    and pack/unpack to convert it from/to a fixed width binary string.
+    """
+
+    fields = ('filesize', 'id3v1_size', 'id3v1ext_size', 'id3v2_size',
+              'id3v2_version', 'id3v2_flags')
+    __slots__ = fields
+
+    # filesize, id3v1 sizes, id3v2 size, id3v2 version and flags
+    packer = struct.Struct('>QHHIBB')
+
+    def __init__(self, filesize, id3v1_size=0, id3v1ext_size=0, id3v2_size=0,
+                 id3v2_version=0, id3v2_flags=0):
+        values = (filesize, id3v1_size, id3v1ext_size, id3v2_size,
+                  id3v2_version, id3v2_flags)
+        for name, value in zip(self.fields, values):
+            object.__setattr__(self, name, value)
+
+    @classmethod
+    def parse(cls, file):
+        "Reads the tags found in a file-like object supporting negative seeks"
+        file.seek(0, 2)  # end of file
+        filesize = file.tell()
+
+        id3v1_size = id3v1ext_size = id3v2_size = version = flags = 0
+
+        if filesize >= ID3V1_SIZE:
+            file.seek(-ID3V1_SIZE, 2)  # last bytes of file
+            if file.read(3) == 'TAG':
+                id3v1_size = ID3V1_SIZE
+
+        if filesize >= ID3V1_EXTENDED_SIZE:
+            file.seek(-ID3V1_EXTENDED_SIZE, 2)  # 227 before regular tag
+            if file.read(4) == 'TAG+':
+                id3v1ext_size = ID3V1_EXTENDED_SIZE
+
+        if filesize >= ID3V2_HEADER_SIZE:
+            id3, version, revision, flags, size = read_id3v2_header(file)
+            if id3 == 'ID3':
+                # id3v2.4 also includes an optional 10 bytes footer
+                if version == 4 and flags & 0x10:
+                    size += ID3V2_FOOTER_SIZE
+
+                id3v2_size = ID3V2_HEADER_SIZE + size
+            else:
+                version = flags = 0
+
+        return cls(filesize, id3v1_size, id3v1ext_size, id3v2_size,
+                   version, flags)
+
+    @classmethod
+    def unpack(cls, data):
+        "Builds a layout from the binary string returned by pack"
+        return cls(*cls.packer.unpack(data))
+
+    def pack(self):
+        "Returns the layout as a binary string of packer.size bytes"
+        return self.packer.pack(*self.astuple())
+
+    def astuple(self):
+        "Returns the layout fields as a tuple, in fields order"
+        return tuple(getattr(self, name) for name in self.fields)
 
     @property
-    @memento
     def has_id3v1(self):
         "Returns True if the file is id3v1 tagged"
-        if self.filesize < ID3V1_SIZE:
-            return False
-
-        self.file.seek(-ID3V1_SIZE, 2)  # last bytes of file
-        return self.file.read(3) == 'TAG'
+        return self.id3v1_size > 0
 
     @property
-    @memento
     def has_id3v1ext(self):
         "Returns True if the file is id3v1 with extended tag"
-        if self.filesize < ID3V1_EXTENDED_SIZE:
-            return False
-
-        self.file.seek(-ID3V1_EXTENDED_SIZE, 2)  # 227 before regular tag
-        return self.file.read(4) == 'TAG+'
-
-    @property
-    @memento
-    def id3v1ext_size(self):
-        "Returns the size of the extended tag if exists"
-        return ID3V1_EXTENDED_SIZE if self.has_id3v1ext else 0
+        return self.id3v1ext_size > 0
 
     @property
-    @memento
-    def id3v1_size(self):
-        "Returns the size in bytes of the id3v1 tag"
-        return ID3V1_SIZE if self.has_id3v1 else 0
+    def has_id3v2(self):
+        "Returns True if the file is id3v2 tagged"
+        return self.id3v2_size > 0
 
     @property
-    @memento
     def id3v1_totalsize(self):
         "Returns the size in bytes of the id3v1 tag"
         return self.id3v1_size + self.id3v1ext_size
 
     @property
-    @memento
-    def _id3v2_header(self):
-        """Returns id3v2 header: (id3, version, revision, flags, size)
-
-        id3v2 header is 10 bytes long which starts with ID3:
-
-            ID3v2/file identifier      "ID3"
-            ID3v2 version              $03 00
-            ID3v2 flags                %abcd0000
-            ID3v2 size             4 * %0xxxxxxx
-
-        Flags:  The b (6th) bit indicates whether or not the header is
-                followed by an extended header. (mask is 0x40)
-
-        (v2.4)  The d (4th) bit indicates that a footer  is present at the
-                end of the tag. (mask is 0x10)
-        """
-        self.file.seek(0)
-        header = self.file.read(ID3V2_HEADER_SIZE)
-
-        id3, v, r, flags, size = struct.unpack('>3sBBB4s', header)
-
-        return id3, v, r, flags, parse_7bitint(map(ord, size))
-
-    @property
-    @memento
-    def has_id3v2(self):
-        "Returns True if the file is id3v2 tagged"
-        if self.filesize < ID3V2_HEADER_SIZE:
-            return False
-
-        id3, ver, rev, flags, size = self._id3v2_header
-        return id3 == 'ID3'
+    def id3v2_totalsize(self):
+        "Returns the size in bytes of the whole id3v2 tag"
+        return self.id3v2_size
 
     @property
-    @memento
-    def id3v2_size(self):
-        """ Returns the size in bytes of the whole id3v2 tag
-
-        > The ID3v2 tag size is the size of the complete tag after
-        unsychronisation, including padding, excluding the header but not
-        excluding the extended header.
-        """
-        if not self.has_id3v2:
-            return 0
-
-        id3, ver, rev, flags, size = self._id3v2_header
-
-        # id3v2.4 also includes an optional 10 bytes footer
-        if ver == 4 and flags & 0x10:
-            size += ID3V2_FOOTER_SIZE
-
-        return ID3V2_HEADER_SIZE + size
-
-    id3v2_totalsize = id3v2_size
-
-    @property
-    @memento
     def startbyte(self):
         "Returns the starting byte position of music data in the file"
         return self.id3v2_totalsize
 
     @property
-    @memento
     def endbyte(self):
         "Returns the last byte position of music data in the file"
         if not self.has_id3v1:
             return self.filesize
 
-        self.file.seek(-self.id3v1_totalsize, 2)
-        return self.file.tell()
+        return self.filesize - self.id3v1_totalsize
 
     @property
-    @memento
     def music_limits(self):
         "Returns the (start, end) for music in the file"
         return self.startbyte, self.endbyte
 
     @property
-    @memento
     def music_size(self):
         "Returns the total count of music data bytes in the file"
         return self.filesize - self.id3v1_totalsize - self.id3v2_totalsize
 
-    def hash(self, hasher, maxbytes=None):
-        """Returns the hash for a certain audio file ignoring tags """
+    def __setattr__(self, name, value):
+        raise AttributeError(u'TagLayout is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError(u'TagLayout is immutable')
+
+    def __reduce__(self):
+        return type(self), self.astuple()
+
+    def __eq__(self, other):
+        return isinstance(other, TagLayout) and \
+            self.astuple() == other.astuple()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.astuple())
+
+    def __repr__(self):
+        return '{0}({1})'.format(type(self).__name__, ', '.join(
+            '{0}={1!r}'.format(name, getattr(self, name))
+            for name in self.fields))
+
+
+def read_id3v2_header(file):
+    """Returns id3v2 header: (id3, version, revision, flags, size)
+
+    id3v2 header is 10 bytes long which starts with ID3:
+
+        ID3v2/file identifier      "ID3"
+        ID3v2 version              $03 00
+        ID3v2 flags                %abcd0000
+        ID3v2 size             4 * %0xxxxxxx
+
+    Flags:  The b (6th) bit indicates whether or not the header is
+            followed by an extended header. (mask is 0x40)
+
+    (v2.4)  The d (4th) bit indicates that a footer  is present at the
+            end of the tag. (mask is 0x10)
+    """
+    file.seek(0)
+    header = file.read(ID3V2_HEADER_SIZE)
+
+    id3, v, r, flags, size = struct.unpack('>3sBBB4s', header)
+
+    return id3, v, r, flags, parse_7bitint(map(ord, size))
+
+
+def _layout_property(name):
+    "Returns a read only property delegating on the TagLayout attribute"
+    return property(lambda self: getattr(self.layout, name),
+                    doc=getattr(TagLayout, name).__doc__)
+
+
+class TaggedFile(object):
+    """Thin wrapper around an open file and its TagLayout
+
+    The layout is parsed just once, on creation, unless it is given.
+    """
+
+    def __init__(self, file, layout=None):
+        self.file = file
+        self.layout = TagLayout.parse(file) if layout is None else layout
+
+    filesize = _layout_property('filesize')
+    has_id3v1 = _layout_property('has_id3v1')
+    has_id3v1ext = _layout_property('has_id3v1ext')
+    id3v1_size = _layout_property('id3v1_size')
+    id3v1ext_size = _layout_property('id3v1ext_size')
+    id3v1_totalsize = _layout_property('id3v1_totalsize')
+    has_id3v2 = _layout_property('has_id3v2')
+    id3v2_size = _layout_property('id3v2_size')
+    id3v2_totalsize = id3v2_size
+    startbyte = _layout_property('startbyte')
+    endbyte = _layout_property('endbyte')
+    music_limits = _layout_property('music_limits')
+    music_size = _layout_property('music_size')
+
+    @property
+    def _id3v2_header(self):
+        "Returns id3v2 header: (id3, version, revision, flags, size)"
+        return read_id3v2_header(self.file)
+
+    def hash(self, hasher, maxbytes=None, checkpoints=None, hooks=None):
+        """Returns the hash for a certain audio file ignoring tags
+
+        hooks is a list of Hook objects to use instead of the global HOOKS.
+        """
+        if hooks is None:
+            hooks = HOOKS
+
         start, end = self.music_limits
-        return hashfile(self.file, start, end, hasher, maxbytes)
+        if not hooks:
+            return hashfile(self.file, start, end, hasher, maxbytes,
+                            checkpoints=checkpoints)
+
+        hash = None
+        try:
+            for hook in hooks:
+                hook.tag_probe(self.file, self.music_limits)
+
+            hash = hashfile(self.file, start, end, hasher, maxbytes,
+                            checkpoints=checkpoints, hooks=hooks)
+        finally:
+            end_hooks(hooks, self.file, hash)
+
+        return hash
+
+
+def probe_files(paths):
+    """Parses the tag sizes for many files at once. Requires numpy.
+
+    Reads the first and last bytes of every file into a pair of contiguous
+    buffers and decodes the tags for all of them with array operations.
+
+    Returns a dict of numpy arrays indexed as paths, with the same values
+    that TaggedFile would give for each file: 'filesize', 'has_id3v1',
+    'has_id3v1ext', 'has_id3v2', 'id3v2_version', 'id3v2_revision',
+    'id3v2_flags', 'has_id3v2_footer', 'id3v1_size', 'id3v1ext_size',
+    'id3v2_size', 'startbyte', 'endbyte' and 'music_size'.
+    """
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError(u'probe_files requires numpy to be installed')
+
+    count = len(paths)
+    filesize = numpy.zeros(count, dtype=numpy.int64)
+    heads = bytearray(count * ID3V2_HEADER_SIZE)
+    tails = bytearray(count * ID3V1_EXTENDED_SIZE)
+
+    for i, path in enumerate(paths):
+        with open(path, 'rb') as file:
+            file.seek(0, 2)  # end of file
+            filesize[i] = size = file.tell()
+
+            file.seek(0)
+            head = file.read(ID3V2_HEADER_SIZE)
+            start = i * ID3V2_HEADER_SIZE
+            heads[start:start + len(head)] = head
+
+            # tails are aligned to the right, so tags are at fixed offsets
+            file.seek(-min(size, ID3V1_EXTENDED_SIZE), 2)
+            tail = file.read(ID3V1_EXTENDED_SIZE)
+            end = (i + 1) * ID3V1_EXTENDED_SIZE
+            tails[end - len(tail):end] = tail
+
+    heads = numpy.frombuffer(heads, dtype=numpy.uint8).reshape(
+        count, ID3V2_HEADER_SIZE)
+    tails = numpy.frombuffer(tails, dtype=numpy.uint8).reshape(
+        count, ID3V1_EXTENDED_SIZE)
+
+    def starts_with(columns, marker):
+        marker = numpy.frombuffer(marker, dtype=numpy.uint8)
+        return (columns[:, :len(marker)] == marker).all(axis=1)
+
+    has_id3v1 = (filesize >= ID3V1_SIZE) & starts_with(
+        tails[:, ID3V1_EXTENDED_SIZE - ID3V1_SIZE:], 'TAG')
+    has_id3v1ext = (filesize >= ID3V1_EXTENDED_SIZE) & starts_with(
+        tails, 'TAG+')
+    has_id3v2 = (filesize >= ID3V2_HEADER_SIZE) & starts_with(heads, 'ID3')
+
+    # as in TagLayout, the header fields are 0 for files without id3v2
+    version, revision, flags = (numpy.where(has_id3v2, heads[:, i], 0)
+                                for i in (3, 4, 5))
+    has_footer = has_id3v2 & (version == 4) & (flags & 0x10 != 0)
+
+    # one row per size byte, as parse_7bitint walks them by index
+    size = parse_7bitint(heads[:, 6:10].T.astype(numpy.int64))
+
+    id3v1_size = has_id3v1 * ID3V1_SIZE
+    id3v1ext_size = has_id3v1ext * ID3V1_EXTENDED_SIZE
+    id3v2_size = has_id3v2 * (
+        ID3V2_HEADER_SIZE + size + has_footer * ID3V2_FOOTER_SIZE)
+    id3v1_totalsize = id3v1_size + id3v1ext_size
+
+    return {
+        'filesize': filesize,
+        'has_id3v1': has_id3v1,
+        'has_id3v1ext': has_id3v1ext,
+        'has_id3v2': has_id3v2,
+        'id3v2_version': version,
+        'id3v2_revision': revision,
+        'id3v2_flags': flags,
+        'has_id3v2_footer': has_footer,
+        'id3v1_size': id3v1_size,
+        'id3v1ext_size': id3v1ext_size,
+        'id3v2_size': id3v2_size,
+        'startbyte': id3v2_size,
+        'endbyte': numpy.where(
+            has_id3v1, filesize - id3v1_totalsize, filesize),
+        'music_size': filesize - id3v1_totalsize - id3v2_size,
+    }
+
+
+class Progress(object):
+    """Reports the files and bytes hashed so far into a stream
+
+    Call start and done around the hashing of every file, from any thread.
+    They only update the counters. Within a with block, a background thread
+    renders the report every 'interval' seconds, so stalls are shown too.
+    The totals may be given upfront or grown with add while working.
+
+    The report includes the files and MiB done, the MiB/s during the last
+    interval, the estimated time left and the oldest file being hashed.
+    Bytes are only counted when a file is done, so while hashing a file
+    bigger than what is hashed during an interval, the speed drops to 0 and
+    then jumps when it is done.
+    """
+
+    def __init__(self, files=0, size=0, stream=None, interval=0.5,
+                 clock=time.time):
+        self.files, self.size = files, size
+        self.stream = sys.stderr if stream is None else stream
+        self.interval = interval
+        self.clock = clock
+
+        self.files_done = self.size_done = 0
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+        self.thread = None
+
+        self.started_at = self.rendered_at = clock()
+        self.rendered_size = 0
+        self.line_length = 0
+
+    def add(self, path, size):
+        """Adds a file of the given size to the totals. If the path was
+        started, as while parsing its tags, it is no longer in flight
+        """
+        with self.lock:
+            self.inflight.pop(path, None)
+            self.files += 1
+            self.size += size
+
+    def start(self, path):
+        "Marks the given path as being hashed"
+        with self.lock:
+            self.inflight[path] = self.clock()
+
+    def done(self, path, size):
+        "Marks the given path as hashed, adding its size to the bytes done"
+        with self.lock:
+            self.inflight.pop(path, None)
+            self.files_done += 1
+            self.size_done += size
+
+    def report(self):
+        "Returns the report line and resets the current speed interval"
+        with self.lock:
+            now = self.clock()
+            files_done, size_done = self.files_done, self.size_done
+            slowest = min(self.inflight.items(), key=lambda item: item[1]) \
+                if self.inflight else None
+
+            elapsed = now - self.rendered_at
+            speed = (size_done - self.rendered_size) / float(elapsed) \
+                if elapsed > 0 else 0.0
+            self.rendered_at, self.rendered_size = now, size_done
+
+        elapsed = now - self.started_at
+        if size_done and elapsed > 0:
+            eta = format_seconds(
+                (self.size - size_done) * elapsed / float(size_done))
+        else:
+            eta = u'--:--:--'
+
+        line = u'{0}/{1} files, {2:.1f}/{3:.1f} MiB, {4:.1f} MiB/s, ETA {5}'\
+            .format(files_done, self.files, size_done / 2.0 ** 20,
+                    self.size / 2.0 ** 20, speed / 2 ** 20, eta)
+
+        if slowest is not None:
+            path, started_at = slowest
+            line += u', slowest {0} ({1:.0f}s)'.format(
+                os.path.basename(path), now - started_at)
+
+        return line
+
+    def render(self):
+        "Writes the report over the previous one"
+        line = self.report()
+        padding = u' ' * max(0, self.line_length - len(line))
+        self.line_length = len(line)
+
+        self.stream.write(u'\r' + line + padding)
+        self.stream.flush()
+
+    def run(self):
+        "Renders the report every interval until the progress is finished"
+        while True:
+            self.finished.wait(self.interval)
+            if self.finished.is_set():
+                break
+
+            self.render()
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.finished.set()
+        self.thread.join()
+        self.render()
+        self.stream.write(u'\n')
+        self.stream.flush()
+
+
+def format_seconds(seconds):
+    "Returns the given seconds as a H:MM:SS string"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return u'{0}:{1:02d}:{2:02d}'.format(hours, minutes, seconds)
+
+
+# hex digests, optionally joined by ',' (--ladder) or ':' (--verify)
+MANIFEST_HASH = re.compile(r'^[0-9a-fA-F]+([,:][0-9a-fA-F]+)*( |$)')
+
+
+def read_manifest(lines):
+    """Parses the lines of a mp3hash output into (path, hash) pairs
+
+    Each line has the 'hash filename' form, as printed by the mp3hash script.
+    Lines not starting with a hash, like blank lines or the messages about
+    missing files, are skipped. Raises ValueError on lines without filename.
+    """
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if not MANIFEST_HASH.match(line):
+            continue
+
+        try:
+            hash, path = line.split(' ', 1)
+        except ValueError:
+            raise ValueError(u"Manifest line has no filename: '{0}'"
+                             .format(line))
+
+        yield path, hash
+
+
+def external_sort(records, buffersize=2 ** 16, fanin=64):
+    """Sorts an iterable of string tuples using bounded memory
+
+    At most 'buffersize' records are kept in memory at once. Sorted runs are
+    spilled into temporary files and lazily merged, 'fanin' runs at a time.
+    Fields must not contain newlines nor NUL characters.
+    """
+    runs = []
+    records = iter(records)
+    while True:
+        chunk = sorted(islice(records, buffersize))
+        if not chunk:
+            break
+        runs.append(_spill(chunk))
+
+    while len(runs) > fanin:
+        runs = [_spill(heapq.merge(*map(_read_run, runs[i:i + fanin])))
+                for i in range(0, len(runs), fanin)]
+
+    return heapq.merge(*map(_read_run, runs))
+
+
+def _spill(records):
+    "Writes records into a temporary file, one per line, and rewinds it"
+    run = tempfile.TemporaryFile(mode='w+')
+    for record in records:
+        _write_record(run, record)
+
+    run.seek(0)
+    return run
+
+
+def _write_record(run, record):
+    "Writes a record as a line of NUL separated fields"
+    run.write('\0'.join(record) + '\n')
+
+
+def _read_run(run):
+    "Reads back the records written by _spill and closes the file"
+    try:
+        for line in run:
+            yield tuple(line[:-1].split('\0'))
+    finally:
+        run.close()
+
+
+def diff_manifests(old, new, buffersize=2 ** 16):
+    """Compares two mp3hash manifests in bounded memory
+
+    old and new are iterables of (path, hash) pairs, like those returned by
+    read_manifest. Yields (status, old path, old hash, new path, new hash)
+    tuples, with None on the missing fields, where status is one of:
+
+    * 'added', 'removed': the path exists only in one of the manifests.
+    * 'modified': the path exists once in both with a different hash.
+    * 'renamed': a removed and an added path share the same hash.
+    * 'moved-duplicate': same as renamed, but the hash belongs to several
+      removed or added paths so the pairing between them is arbitrary.
+
+    Both manifests are merge-joined by path and hash to discard unchanged
+    entries, then the rest by path, and then the unmatched entries by hash.
+    A path repeated in any manifest is never paired by path, so its changed
+    entries are reported as removed, added or moved instead of modified.
+    See external_sort for the memory bounds.
+    """
+    runs = [tempfile.TemporaryFile(mode='w+') for _ in range(4)]
+    old_only, new_only, removed, added = runs
+    try:
+        # entries present in both manifests are unchanged, cancel them first
+        joined = _merge_join(
+            _mark_duplicates(external_sort(old, buffersize)),
+            _mark_duplicates(external_sort(new, buffersize)),
+            key=itemgetter(0, 1))
+
+        for old_entry, new_entry in joined:
+            if new_entry is None:
+                _write_record(old_only, _flag_duplicate(old_entry))
+            elif old_entry is None:
+                _write_record(new_only, _flag_duplicate(new_entry))
+
+        old_only.seek(0)
+        new_only.seek(0)
+        joined = _merge_join(_read_run(old_only), _read_run(new_only))
+
+        for old_entry, new_entry in joined:
+            if old_entry is not None and new_entry is not None and \
+                    not old_entry[2] and not new_entry[2]:
+                yield ('modified',) + old_entry[:2] + new_entry[:2]
+                continue
+
+            # repeated paths can't be told apart, so they are never modified
+            if old_entry is not None:
+                path, hash, _ = old_entry
+                _write_record(removed, (hash, path))
+            if new_entry is not None:
+                path, hash, _ = new_entry
+                _write_record(added, (hash, path))
+
+        removed.seek(0)
+        added.seek(0)
+        joined = _merge_join(
+            _mark_duplicates(external_sort(_read_run(removed), buffersize)),
+            _mark_duplicates(external_sort(_read_run(added), buffersize)),
+        )
+
+        for old_entry, new_entry in joined:
+            if new_entry is None:
+                hash, path, _ = old_entry
+                yield 'removed', path, hash, None, None
+            elif old_entry is None:
+                hash, path, _ = new_entry
+                yield 'added', None, None, path, hash
+            else:
+                hash, old_path, old_duplicated = old_entry
+                hash, new_path, new_duplicated = new_entry
+                status = 'moved-duplicate' \
+                    if old_duplicated or new_duplicated else 'renamed'
+                yield status, old_path, hash, new_path, hash
+    finally:
+        for run in runs:
+            run.close()
+
+
+def _merge_join(left, right, key=itemgetter(0)):
+    """Full outer join of two iterables of tuples sorted by key
+
+    Yields (left, right) pairs with matching keys, pairing repeated keys in
+    order, or with None on the side which is missing. By default the key is
+    the first field of the tuples.
+    """
+    left, right = iter(left), iter(right)
+    lnext, rnext = next(left, None), next(right, None)
+    while lnext is not None or rnext is not None:
+        if rnext is None or (lnext is not None and key(lnext) < key(rnext)):
+            yield lnext, None
+            lnext = next(left, None)
+        elif lnext is None or key(rnext) < key(lnext):
+            yield None, rnext
+            rnext = next(right, None)
+        else:
+            yield lnext, rnext
+            lnext, rnext = next(left, None), next(right, None)
+
+
+def _flag_duplicate(record):
+    "Turns the flag added by _mark_duplicates into a string field"
+    return record[:-1] + ('1' if record[-1] else '',)
+
+
+def _mark_duplicates(records):
+    """Appends to each sorted record whether its first field is repeated
+    in the previous or the next record
+    """
+    previous = current = None
+    for record in records:
+        if current is not None:
+            yield current + (current[0] in (previous[0], record[0]),)
+        previous, current = current or (None,), record
+
+    if current is not None:
+        yield current + (current[0] == previous[0],)
@@ -16,6 +16,8 @@ SCRIPT = 'mp3hash'
 NON_EXISTENT_PATH = '/non/existent/path'
 NON_EXISTENT_ALGORITHM = 'I am not a hash'
 NON_EXISTENT_FILE = 'nonexistent.txt'
+OLD_MANIFEST = 'old-manifest.txt'
+NEW_MANIFEST = 'new-manifest.txt'
 
 
 def call(*args):
@@ -186,3 +188,101 @@ class TestHashing(object):
         retcode, output = call(SCRIPT, *paths)
 
         assert_that(output.count('\n'), is_(len(paths)))
+
+
+class TestLadderOption(object):
+    def test_ladder_option_outputs_comma_separated_hashes(self):
+        hashes = mp3hash.mp3hash(SONG1_PATH, checkpoints=[1024, 2 ** 20])
+
+        retcode, output = call(SCRIPT, SONG1_PATH, '--ladder', '1K,1M')
+
+        assert_that(output, starts_with(','.join(hashes) + ' '))
+
+    def test_invalid_ladder_exits_with_invalid_argument(self):
+        retcode, output = call(SCRIPT, SONG1_PATH, '--ladder', '1K,foo')
+
+        assert_that(retcode, is_(errno.EINVAL))
+
+
+class TestCensusCommand(object):
+    def test_census_counts_probed_files(self):
+        retcode, output = call(SCRIPT, 'census', SONG1_PATH, SONG2_PATH)
+
+        assert_that(output, contains_string(u'files: 2\n'))
+
+    def test_census_without_files_exits_with_invalid_argument(self):
+        retcode, output = call(SCRIPT, 'census')
+
+        assert_that(retcode, is_(errno.EINVAL))
+
+
+class TestProgressOption(object):
+    def test_progress_reports_files_done(self):
+        retcode, output = call(SCRIPT, SONG1_PATH, SONG2_PATH, '--progress')
+
+        assert_that(output, contains_string(u'2/2 files'))
+
+    def test_progress_counts_verified_files(self):
+        retcode, output = call(SCRIPT, SONG1_PATH, SONG2_PATH, '--progress',
+                               '--algorithm', 'crc32', '--verify', 'sha1')
+
+        assert_that(output, contains_string(u'4/4 files'))
+
+
+class TestVerifyOption(object):
+    def test_verify_option_hashes_collisions_again(self):
+        hash = mp3hash.mp3hash(SONG1_PATH, hasher='crc32') + ':' + \
+            mp3hash.mp3hash(SONG1_PATH, hasher='sha1')
+
+        retcode, output = call(SCRIPT, SONG1_PATH, SONG2_PATH,
+                               '--algorithm', 'crc32', '--verify', 'sha1')
+
+        assert_that(output, starts_with(hash + ' '))
+
+    def test_non_existent_verify_algorithm_outputs_error(self):
+        retcode, output = call(
+            SCRIPT, '--verify', NON_EXISTENT_ALGORITHM, SONG1_PATH)
+
+        assert_that(retcode, is_(errno.EINVAL))
+
+
+class TestDiffCommand(object):
+    def setup(self):
+        hash = mp3hash.mp3hash(SONG1_PATH)
+        with open(OLD_MANIFEST, 'w') as manifest:
+            manifest.write(hash + ' file1.mp3\n' + hash + ' file2.mp3\n')
+        with open(NEW_MANIFEST, 'w') as manifest:
+            manifest.write(hash + ' file1.mp3\n' + '0f' + ' file2.mp3\n')
+
+    def teardown(self):
+        os.unlink(OLD_MANIFEST)
+        os.unlink(NEW_MANIFEST)
+
+    def test_diff_outputs_changes(self):
+        hash = mp3hash.mp3hash(SONG1_PATH)
+
+        retcode, output = call(SCRIPT, 'diff', OLD_MANIFEST, NEW_MANIFEST)
+
+        assert_that(output, is_(u'modified ' + hash + ' 0f file2.mp3\n'))
+
+    def test_diff_of_same_manifest_outputs_nothing(self):
+        retcode, output = call(SCRIPT, 'diff', OLD_MANIFEST, OLD_MANIFEST)
+
+        assert_that(output, is_(u''))
+
+    def test_diff_with_one_manifest_exits_with_invalid_argument(self):
+        retcode, output = call(SCRIPT, 'diff', OLD_MANIFEST)
+
+        assert_that(retcode, is_(errno.EINVAL))
+
+    def test_double_dash_hashes_a_file_named_diff(self):
+        retcode, output = call(SCRIPT, '--', 'diff')
+
+        assert_that(output, contains_string(u"File at 'diff' does not exist"))
+
+
+class TestSubcommandNames(object):
+    def test_relative_path_hashes_a_file_named_census(self):
+        retcode, output = call(SCRIPT, './census')
+
+        assert_that(output, contains_string(u"File at './census' does not"))
@@ -7,7 +7,7 @@ import hashlib
 from hamcrest import *
 from nose.tools import raises
 
-from mp3hash import mp3hash
+from mp3hash import mp3hash, two_tier_hash, verify_collisions, Crc32Hasher
 
 from tests.integration import SONG1_PATH, SONG2_PATH
 
@@ -72,3 +72,39 @@ class TestHashOperations(object):
         hash2 = mp3hash(SONG2_PATH, hasher=hasher())
 
         assert_that(hash1, is_(equal_to(hash2)))
+
+    def test_checkpoints_match_maxbytes_hashes(self):
+        checkpoints = [1024, 250 * 1024]
+
+        hashes = mp3hash(SONG1_PATH, checkpoints=checkpoints)
+
+        assert_that(hashes, is_([
+            mp3hash(SONG2_PATH, maxbytes=checkpoints[0]),
+            mp3hash(SONG2_PATH, maxbytes=checkpoints[1]),
+            mp3hash(SONG2_PATH),
+        ]))
+
+    @raises(ValueError)
+    def test_checkpoints_negative(self):
+        mp3hash(SONG1_PATH, checkpoints=[1024, -15])
+
+    def test_hasher_by_name(self):
+        hash1 = mp3hash(SONG1_PATH, hasher='crc32')
+        hash2 = mp3hash(SONG2_PATH, hasher=Crc32Hasher())
+
+        assert_that(hash1, is_(equal_to(hash2)))
+
+
+class TestTwoTierHash(object):
+    def test_collisions_are_verified_with_strong_hash(self):
+        hashes = two_tier_hash([SONG1_PATH, SONG2_PATH])
+
+        expected = mp3hash(SONG1_PATH, hasher='crc32') + ':' + \
+            mp3hash(SONG1_PATH, hasher='sha1')
+        assert_that(hashes, is_([(SONG1_PATH, expected),
+                                 (SONG2_PATH, expected)]))
+
+    def test_unique_hashes_are_not_verified(self):
+        hashes = verify_collisions([(SONG1_PATH, 'unique')])
+
+        assert_that(hashes, is_([(SONG1_PATH, 'unique')]))
@@ -0,0 +1,128 @@
+#-*- coding: utf-8 -*-
+
+from cStringIO import StringIO
+
+from hamcrest import assert_that, is_, contains, contains_inanyorder
+from nose.tools import raises
+
+from mp3hash import read_manifest, external_sort, diff_manifests
+
+
+OLD = [('a.mp3', '01'), ('b.mp3', '02'), ('c.mp3', '03'), ('d.mp3', '04')]
+
+
+def diff(old, new):
+    return list(diff_manifests(old, new, buffersize=2))
+
+
+class TestReadManifest(object):
+    def test_parses_hash_and_path(self):
+        manifest = StringIO('01 a.mp3\n02 some song.mp3\n')
+
+        assert_that(list(read_manifest(manifest)),
+                    is_([('a.mp3', '01'), ('some song.mp3', '02')]))
+
+    def test_skips_blank_lines(self):
+        manifest = StringIO('\n01 a.mp3\n\n')
+
+        assert_that(list(read_manifest(manifest)), is_([('a.mp3', '01')]))
+
+    def test_skips_lines_not_starting_with_a_hash(self):
+        manifest = StringIO(
+            "File at 'x.mp3' does not exist or it is not a regular file\n"
+            "01 a.mp3\n")
+
+        assert_that(list(read_manifest(manifest)), is_([('a.mp3', '01')]))
+
+    def test_parses_ladder_and_verified_hashes(self):
+        manifest = StringIO('01,0a a.mp3\n0f:ab b.mp3\n')
+
+        assert_that(list(read_manifest(manifest)),
+                    is_([('a.mp3', '01,0a'), ('b.mp3', '0f:ab')]))
+
+    @raises(ValueError)
+    def test_fails_on_lines_without_path(self):
+        list(read_manifest(StringIO('01\n')))
+
+
+class TestExternalSort(object):
+    def test_sorts_records_in_several_runs(self):
+        records = [(str(n), 'x') for n in range(100, 0, -1)]
+
+        result = list(external_sort(records, buffersize=3, fanin=2))
+
+        assert_that(result, is_(sorted(records)))
+
+    def test_sorts_nothing(self):
+        assert_that(list(external_sort([])), is_([]))
+
+
+class TestDiffManifests(object):
+    def test_same_manifests_have_no_changes(self):
+        assert_that(diff(OLD, list(reversed(OLD))), is_([]))
+
+    def test_detects_added_paths(self):
+        new = OLD + [('e.mp3', '05')]
+
+        assert_that(diff(OLD, new),
+                    is_([('added', None, None, 'e.mp3', '05')]))
+
+    def test_detects_removed_paths(self):
+        new = OLD[1:]
+
+        assert_that(diff(OLD, new),
+                    is_([('removed', 'a.mp3', '01', None, None)]))
+
+    def test_detects_modified_paths(self):
+        new = OLD[:-1] + [('d.mp3', '05')]
+
+        assert_that(diff(OLD, new),
+                    is_([('modified', 'd.mp3', '04', 'd.mp3', '05')]))
+
+    def test_detects_renamed_paths(self):
+        new = OLD[:-1] + [('z.mp3', '04')]
+
+        assert_that(diff(OLD, new),
+                    is_([('renamed', 'd.mp3', '04', 'z.mp3', '04')]))
+
+    def test_detects_moved_duplicates(self):
+        old = OLD + [('e.mp3', '04')]
+        new = OLD[:-1] + [('y.mp3', '04'), ('z.mp3', '04')]
+
+        assert_that(diff(old, new), contains_inanyorder(
+            ('moved-duplicate', 'd.mp3', '04', 'y.mp3', '04'),
+            ('moved-duplicate', 'e.mp3', '04', 'z.mp3', '04'),
+        ))
+
+    def test_repeated_paths_are_compared_by_content(self):
+        old = [('a.mp3', '01'), ('a.mp3', '02')]
+        new = [('a.mp3', '02'), ('a.mp3', '03')]
+
+        assert_that(diff(old, new), contains(
+            ('removed', 'a.mp3', '01', None, None),
+            ('added', None, None, 'a.mp3', '03'),
+        ))
+
+    def test_repeated_paths_can_be_moved(self):
+        old = [('a.mp3', '01'), ('a.mp3', '02')]
+        new = [('a.mp3', '02'), ('b.mp3', '01')]
+
+        assert_that(diff(old, new),
+                    is_([('renamed', 'a.mp3', '01', 'b.mp3', '01')]))
+
+    def test_repeated_paths_left_unpaired_are_removed(self):
+        old = [('a.mp3', '01'), ('a.mp3', '02'), ('a.mp3', '03')]
+        new = [('a.mp3', '02')]
+
+        assert_that(diff(old, new), contains_inanyorder(
+            ('removed', 'a.mp3', '01', None, None),
+            ('removed', 'a.mp3', '03', None, None),
+        ))
+
+    def test_unpaired_duplicates_are_added(self):
+        new = OLD + [('y.mp3', '04'), ('z.mp3', '04')]
+
+        assert_that(diff(OLD, new), contains(
+            ('added', None, None, 'y.mp3', '04'),
+            ('added', None, None, 'z.mp3', '04'),
+        ))
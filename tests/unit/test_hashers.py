@@ -0,0 +1,82 @@
+#-*- coding: utf-8 -*-
+
+import zlib
+
+from hamcrest import assert_that, is_, has_items, instance_of
+from nose.tools import raises
+
+import mp3hash
+from mp3hash import (Crc32Hasher, Adler32Hasher, new_hasher, register_hasher,
+                     verify_collisions, colliding_hashes,
+                     algorithms)
+
+
+DATA = 'some music data' * 100
+
+
+class TestChecksumHashers(object):
+    def test_crc32_hashes_in_several_updates(self):
+        hasher = Crc32Hasher()
+
+        hasher.update(DATA[:10])
+        hasher.update(DATA[10:])
+
+        assert_that(hasher.hexdigest(),
+                    is_('{0:08x}'.format(zlib.crc32(DATA) & 0xffffffff)))
+
+    def test_adler32_hashes_in_several_updates(self):
+        hasher = Adler32Hasher()
+
+        hasher.update(DATA[:10])
+        hasher.update(DATA[10:])
+
+        assert_that(hasher.hexdigest(),
+                    is_('{0:08x}'.format(zlib.adler32(DATA) & 0xffffffff)))
+
+    def test_hexdigest_has_fixed_width(self):
+        assert_that(Crc32Hasher().hexdigest(), is_('00000000'))
+
+    def test_copies_are_independent(self):
+        hasher = Crc32Hasher()
+        hasher.update(DATA)
+
+        copy = hasher.copy()
+        copy.update(DATA)
+
+        assert_that(hasher.hexdigest(),
+                    is_('{0:08x}'.format(zlib.crc32(DATA) & 0xffffffff)))
+
+
+class TestHasherRegistry(object):
+    def teardown(self):
+        mp3hash.HASHERS.pop('test', None)
+
+    def test_includes_hashlib_and_checksum_algorithms(self):
+        assert_that(algorithms(), has_items('md5', 'sha1', 'crc32', 'adler32'))
+
+    def test_creates_hashers_by_name(self):
+        assert_that(new_hasher('crc32'), instance_of(Crc32Hasher))
+
+    def test_registers_new_hashers(self):
+        register_hasher('test', Adler32Hasher)
+
+        assert_that(new_hasher('test'), instance_of(Adler32Hasher))
+
+    @raises(ValueError)
+    def test_fails_on_unknown_algorithm(self):
+        new_hasher('I am not a hash')
+
+
+class TestVerifyCollisions(object):
+    def test_rehashes_only_colliding_hashes(self):
+        hashes = [('a.mp3', '01'), ('b.mp3', '01'), ('c.mp3', '02')]
+
+        verified = verify_collisions(hashes, hash_function=lambda p: p[0] * 2)
+
+        assert_that(verified, is_([
+            ('a.mp3', '01:aa'), ('b.mp3', '01:bb'), ('c.mp3', '02'),
+        ]))
+
+    def test_collisions_of_unique_hashes_are_empty(self):
+        assert_that(colliding_hashes([('a.mp3', '01'), ('b.mp3', '02')]),
+                    is_(set()))
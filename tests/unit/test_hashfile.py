@@ -0,0 +1,63 @@
+#-*- coding: utf-8 -*-
+
+import hashlib
+from cStringIO import StringIO
+
+from hamcrest import assert_that, is_
+
+from mp3hash import hashfile
+
+
+DATA = ''.join(map(chr, range(256))) * 4
+START, END = 10, len(DATA) - 10
+MUSIC = DATA[START:END]
+
+
+def sha1(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+class TestHashfile(object):
+    def test_hashes_data_between_limits(self):
+        hash = hashfile(StringIO(DATA), START, END, hashlib.sha1(),
+                        blocksize=100)
+
+        assert_that(hash, is_(sha1(MUSIC)))
+
+    def test_hashes_up_to_maxbytes(self):
+        hash = hashfile(StringIO(DATA), START, END, hashlib.sha1(),
+                        maxbytes=50, blocksize=100)
+
+        assert_that(hash, is_(sha1(MUSIC[:50])))
+
+
+class TestHashfileCheckpoints(object):
+    def test_returns_hash_for_every_checkpoint_and_full_hash(self):
+        hashes = hashfile(StringIO(DATA), START, END, hashlib.sha1(),
+                          blocksize=100, checkpoints=[64, 150, 1000])
+
+        assert_that(hashes, is_([
+            sha1(MUSIC[:64]), sha1(MUSIC[:150]), sha1(MUSIC[:1000]),
+            sha1(MUSIC)
+        ]))
+
+    def test_returns_checkpoints_in_ascending_order(self):
+        hashes = hashfile(StringIO(DATA), START, END, hashlib.sha1(),
+                          checkpoints=[150, 64])
+
+        assert_that(hashes, is_([sha1(MUSIC[:64]), sha1(MUSIC[:150]),
+                                 sha1(MUSIC)]))
+
+    def test_checkpoints_beyond_data_get_full_hash(self):
+        hashes = hashfile(StringIO(DATA), START, END, hashlib.sha1(),
+                          checkpoints=[64, len(DATA)])
+
+        assert_that(hashes, is_([sha1(MUSIC[:64]), sha1(MUSIC),
+                                 sha1(MUSIC)]))
+
+    def test_checkpoints_are_limited_by_maxbytes(self):
+        hashes = hashfile(StringIO(DATA), START, END, hashlib.sha1(),
+                          maxbytes=100, checkpoints=[64, 150])
+
+        assert_that(hashes, is_([sha1(MUSIC[:64]), sha1(MUSIC[:100]),
+                                 sha1(MUSIC[:100])]))
@@ -0,0 +1,223 @@
+#-*- coding: utf-8 -*-
+
+import os
+import sys
+import hashlib
+import tempfile
+from StringIO import StringIO as SlowStringIO
+from cStringIO import StringIO
+
+from hamcrest import assert_that, is_, has_length, greater_than, none
+from nose.tools import raises
+from nose.plugins.skip import SkipTest
+
+import mp3hash
+from mp3hash import (Hook, ProfileHook, TracemallocHook, TaggedFile, hashfile,
+                     register_hook, unregister_hook)
+
+
+DATA = 'ID3' + ''.join(map(chr, [3, 0, 0, 0, 0, 0, 0x10])) + '\0' * 16 + \
+    '\xff' * 1000
+
+
+class FailingFile(SlowStringIO):
+    "Fails reading once the tags have been parsed"
+    failing = False
+
+    def read(self, *args):
+        if self.failing:
+            raise IOError('read error')
+        return SlowStringIO.read(self, *args)
+
+
+def failing_tagged_file():
+    tagged = TaggedFile(FailingFile(DATA))
+    tagged.file.failing = True
+    return tagged
+
+
+class FailingHook(Hook):
+    "Fails on the given event"
+    def __init__(self, event):
+        def fail(*args):
+            raise ValueError(event)
+        setattr(self, event, fail)
+
+
+class RecordingHook(Hook):
+    def __init__(self):
+        self.events = []
+
+    def file_open(self, file):
+        self.events.append(('file_open',))
+
+    def tag_probe(self, file, music_limits):
+        self.events.append(('tag_probe', music_limits))
+
+    def block(self, file, size):
+        self.events.append(('block', size))
+
+    def file_done(self, file, hash):
+        self.events.append(('file_done', hash))
+
+
+class TestHooks(object):
+    def setup(self):
+        self.hook = RecordingHook()
+        self.hash = hashlib.sha1('\xff' * 1000).hexdigest()
+
+    def teardown(self):
+        del mp3hash.HOOKS[:]
+
+    def test_tagged_file_hash_calls_hooks(self):
+        TaggedFile(StringIO(DATA)).hash(hashlib.sha1(), hooks=[self.hook])
+
+        assert_that(self.hook.events, is_([
+            ('tag_probe', (26, 1026)),
+            ('block', 1000),
+            ('file_done', self.hash),
+        ]))
+
+    def test_hashfile_calls_block_hook_for_every_block(self):
+        hashfile(StringIO(DATA), 26, 1026, hashlib.sha1(), blocksize=300,
+                 hooks=[self.hook])
+
+        assert_that(self.hook.events, is_([
+            ('block', 300), ('block', 300), ('block', 300), ('block', 100),
+        ]))
+
+    def test_mp3hash_calls_file_open_hook(self):
+        fd, path = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as file:
+            file.write(DATA)
+
+        try:
+            mp3hash.mp3hash(path, hooks=[self.hook])
+        finally:
+            os.unlink(path)
+
+        assert_that(self.hook.events[0], is_(('file_open',)))
+        assert_that(self.hook.events[-1], is_(('file_done', self.hash)))
+
+    def test_file_done_is_called_when_hashing_fails(self):
+        try:
+            failing_tagged_file().hash(hashlib.sha1(), hooks=[self.hook])
+        except IOError:
+            pass
+
+        assert_that(self.hook.events[-1], is_(('file_done', None)))
+
+    @raises(IOError)
+    def test_hashing_errors_are_raised(self):
+        failing_tagged_file().hash(hashlib.sha1(), hooks=[self.hook])
+
+    def test_file_done_is_called_when_a_hook_fails_on_tag_probe(self):
+        hooks = [self.hook, FailingHook('tag_probe')]
+
+        try:
+            TaggedFile(StringIO(DATA)).hash(hashlib.sha1(), hooks=hooks)
+        except ValueError:
+            pass
+
+        assert_that(self.hook.events, is_([
+            ('tag_probe', (26, 1026)), ('file_done', None),
+        ]))
+
+    def test_file_done_is_called_when_a_hook_fails_on_file_done(self):
+        hooks = [FailingHook('file_done'), self.hook]
+
+        try:
+            TaggedFile(StringIO(DATA)).hash(hashlib.sha1(), hooks=hooks)
+        except ValueError:
+            pass
+
+        assert_that(self.hook.events[-1], is_(('file_done', self.hash)))
+
+    def test_file_done_is_called_when_a_hook_fails_on_file_open(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        hooks = [self.hook, FailingHook('file_open')]
+
+        try:
+            mp3hash.mp3hash(path, hooks=hooks)
+        except ValueError:
+            pass
+        finally:
+            os.unlink(path)
+
+        assert_that(self.hook.events, is_([
+            ('file_open',), ('file_done', None),
+        ]))
+
+    def test_registered_hooks_are_used_by_default(self):
+        register_hook(self.hook)
+
+        TaggedFile(StringIO(DATA)).hash(hashlib.sha1())
+
+        assert_that(self.hook.events, has_length(3))
+
+    def test_given_hooks_replace_registered_ones(self):
+        register_hook(self.hook)
+
+        TaggedFile(StringIO(DATA)).hash(hashlib.sha1(), hooks=[])
+
+        assert_that(self.hook.events, is_([]))
+
+    def test_unregistered_hooks_are_not_used(self):
+        register_hook(self.hook)
+        unregister_hook(self.hook)
+
+        TaggedFile(StringIO(DATA)).hash(hashlib.sha1())
+
+        assert_that(self.hook.events, is_([]))
+
+
+class TestProfileHook(object):
+    def test_profiles_hashing(self):
+        hook = ProfileHook()
+
+        TaggedFile(StringIO(DATA)).hash(hashlib.sha1(), hooks=[hook])
+
+        assert_that(hook.stats.total_calls, greater_than(0))
+
+    def test_stops_profiling_when_hashing_fails(self):
+        hook = ProfileHook()
+
+        try:
+            failing_tagged_file().hash(hashlib.sha1(), hooks=[hook])
+        except IOError:
+            pass
+
+        assert_that(sys.getprofile(), is_(none()))
+
+    def test_stops_profiling_when_a_hook_fails_on_tag_probe(self):
+        hooks = [ProfileHook(), RecordingHook(), FailingHook('tag_probe')]
+
+        try:
+            TaggedFile(StringIO(DATA)).hash(hashlib.sha1(), hooks=hooks)
+        except ValueError:
+            pass
+
+        assert_that(sys.getprofile(), is_(none()))
+
+
+class TestTracemallocHook(object):
+    def setup(self):
+        try:
+            self.hook = TracemallocHook()
+        except ImportError:
+            raise SkipTest('tracemalloc is not available')
+
+    def test_records_memory_for_every_file(self):
+        for _ in range(2):
+            TaggedFile(StringIO(DATA)).hash(hashlib.sha1(), hooks=[self.hook])
+
+        assert_that(self.hook.results, has_length(2))
+
+    def test_forgets_files_when_hashing_fails(self):
+        try:
+            failing_tagged_file().hash(hashlib.sha1(), hooks=[self.hook])
+        except IOError:
+            pass
+
+        assert_that(self.hook.started, is_({}))
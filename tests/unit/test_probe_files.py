@@ -0,0 +1,80 @@
+#-*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+
+from hamcrest import assert_that, is_
+
+from mp3hash import (probe_files, TaggedFile, ID3V1_SIZE, ID3V1_EXTENDED_SIZE,
+                     ID3V2_HEADER_SIZE)
+
+
+ID3V1 = 'TAG' + '\n' * (ID3V1_SIZE - 3)
+ID3V1_EXT = 'TAG+' + '\n' * (ID3V1_EXTENDED_SIZE - 4)
+ID3V23 = 'ID3' + ''.join(map(chr, [3, 0, 0, 0, 0, 0x02, 0x01])) + '\0' * 257
+ID3V24 = 'ID3' + ''.join(map(chr, [4, 0, 0x10, 0, 0, 0x02, 0x01])) + '\0' * 267
+MUSIC = '\xff' * 1024
+
+FILES = [
+    '',
+    'ID3',
+    MUSIC,
+    '\xff\xfb\x90\x64' + MUSIC,
+    ID3V23 + MUSIC,
+    ID3V24 + MUSIC + ID3V1,
+    MUSIC + ID3V1_EXT + ID3V1,
+    ID3V23 + ID3V1,
+    ID3V1,
+]
+
+COLUMNS = ('filesize', 'has_id3v1', 'has_id3v1ext', 'has_id3v2',
+           'id3v1_size', 'id3v1ext_size', 'id3v2_size', 'music_size')
+
+
+LAYOUT_COLUMNS = ('id3v2_version', 'id3v2_flags')
+
+
+class TestProbeFiles(object):
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+        self.paths = []
+        for i, content in enumerate(FILES):
+            path = os.path.join(self.directory, '{0}.mp3'.format(i))
+            with open(path, 'wb') as file:
+                file.write(content)
+            self.paths.append(path)
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+
+    def tagged(self, path):
+        with open(path, 'rb') as file:
+            tagged = TaggedFile(file)
+            values = dict((name, getattr(tagged, name))
+                          for name in COLUMNS + ('music_limits',))
+            for name in LAYOUT_COLUMNS:
+                values[name] = getattr(tagged.layout, name)
+            return values
+
+    def test_gives_the_same_values_as_tagged_file(self):
+        table = probe_files(self.paths)
+
+        for i, path in enumerate(self.paths):
+            expected = self.tagged(path)
+            for name in COLUMNS + LAYOUT_COLUMNS:
+                assert_that(table[name][i], is_(expected[name]))
+
+            limits = table['startbyte'][i], table['endbyte'][i]
+            assert_that(limits, is_(expected['music_limits']))
+
+    def test_decodes_id3v2_versions_and_footers(self):
+        table = probe_files(self.paths[4:6])
+
+        assert_that(list(table['id3v2_version']), is_([3, 4]))
+        assert_that(list(table['has_id3v2_footer']), is_([False, True]))
+
+    def test_probes_no_files(self):
+        table = probe_files([])
+
+        assert_that(len(table['music_size']), is_(0))
@@ -0,0 +1,84 @@
+#-*- coding: utf-8 -*-
+
+from StringIO import StringIO
+
+from hamcrest import assert_that, is_, contains_string, ends_with
+
+from mp3hash import Progress, format_seconds
+
+
+MiB = 2 ** 20
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestProgress(object):
+    def setup(self):
+        self.clock = Clock()
+        self.stream = StringIO()
+        self.progress = Progress(4, 40 * MiB, stream=self.stream,
+                                 interval=0.01, clock=self.clock)
+
+    def test_reports_files_and_bytes_done(self):
+        self.progress.done('/a.mp3', 10 * MiB)
+
+        assert_that(self.progress.report(),
+                    contains_string(u'1/4 files, 10.0/40.0 MiB'))
+
+    def test_reports_speed_during_last_interval(self):
+        self.clock.now = 2
+        self.progress.done('/a.mp3', 10 * MiB)
+        self.progress.report()
+
+        self.clock.now = 3
+        self.progress.done('/b.mp3', 20 * MiB)
+
+        assert_that(self.progress.report(), contains_string(u'20.0 MiB/s'))
+
+    def test_estimates_time_left(self):
+        self.clock.now = 10
+        self.progress.done('/a.mp3', 10 * MiB)
+
+        assert_that(self.progress.report(), contains_string(u'ETA 0:00:30'))
+
+    def test_reports_oldest_file_being_hashed(self):
+        self.progress.start('/path/slow.mp3')
+        self.clock.now = 5
+        self.progress.start('/path/fast.mp3')
+        self.clock.now = 7
+
+        assert_that(self.progress.report(),
+                    ends_with(u', slowest slow.mp3 (7s)'))
+
+    def test_totals_grow_with_added_files(self):
+        self.progress.start('/path/new.mp3')
+        self.progress.add('/path/new.mp3', 10 * MiB)
+
+        assert_that(self.progress.report(),
+                    contains_string(u'0/5 files, 0.0/50.0 MiB'))
+        assert_that(self.progress.inflight, is_({}))
+
+    def test_done_files_are_not_in_flight(self):
+        self.progress.start('/path/slow.mp3')
+        self.progress.done('/path/slow.mp3', MiB)
+
+        assert_that(self.progress.inflight, is_({}))
+
+    def test_renders_a_final_line_on_exit(self):
+        with self.progress:
+            self.progress.done('/a.mp3', 40 * MiB)
+
+        assert_that(self.stream.getvalue(), ends_with(u'\n'))
+        assert_that(self.stream.getvalue(),
+                    contains_string(u'\r1/4 files'))
+
+
+class TestFormatSeconds(object):
+    def test_formats_hours_minutes_and_seconds(self):
+        assert_that(format_seconds(3723.5), is_(u'1:02:03'))
@@ -0,0 +1,94 @@
+#-*- coding: utf-8 -*-
+
+import pickle
+from cStringIO import StringIO
+
+from hamcrest import assert_that, is_, is_not, instance_of
+from nose.tools import raises
+
+from mp3hash import (TagLayout, TaggedFile, ID3V1_SIZE, ID3V2_HEADER_SIZE,
+                     ID3V2_FOOTER_SIZE)
+
+
+SIZE = 257
+HEADER_v24 = 'ID3' + ''.join(map(chr, [0x4, 0x0, 0x10, 0x0, 0x0, 0x02, 0x01]))
+ID3V1 = 'TAG' + '\n' * (ID3V1_SIZE - 3)
+FILE = HEADER_v24 + '\0' * (SIZE + ID3V2_FOOTER_SIZE) + '\xff' * 100 + ID3V1
+
+class SubLayout(TagLayout):
+    __slots__ = ()
+
+
+LAYOUT = TagLayout(len(FILE), ID3V1_SIZE, 0,
+                   ID3V2_HEADER_SIZE + SIZE + ID3V2_FOOTER_SIZE, 4, 0x10)
+
+
+class TestTagLayout(object):
+    def test_parses_all_tags_from_file(self):
+        layout = TagLayout.parse(StringIO(FILE))
+
+        assert_that(layout, is_(LAYOUT))
+
+    def test_parses_empty_file(self):
+        layout = TagLayout.parse(StringIO())
+
+        assert_that(layout, is_(TagLayout(0)))
+
+    def test_computes_music_limits(self):
+        assert_that(LAYOUT.music_limits, is_((
+            ID3V2_HEADER_SIZE + SIZE + ID3V2_FOOTER_SIZE,
+            len(FILE) - ID3V1_SIZE)))
+
+    def test_different_layouts_are_not_equal(self):
+        assert_that(LAYOUT, is_not(TagLayout(len(FILE))))
+
+    @raises(AttributeError)
+    def test_is_immutable(self):
+        LAYOUT.filesize = 0
+
+    @raises(AttributeError)
+    def test_fields_can_not_be_deleted(self):
+        del LAYOUT.filesize
+
+    @raises(AttributeError)
+    def test_has_no_instance_dict(self):
+        LAYOUT.__dict__
+
+    def test_can_be_pickled(self):
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            data = pickle.dumps(LAYOUT, protocol)
+
+            assert_that(pickle.loads(data), is_(LAYOUT))
+
+    def test_subclasses_keep_their_fields(self):
+        layout = SubLayout(*LAYOUT.astuple())
+
+        assert_that(layout.pack(), is_(LAYOUT.pack()))
+
+    def test_subclasses_can_be_pickled(self):
+        layout = SubLayout(*LAYOUT.astuple())
+
+        unpickled = pickle.loads(pickle.dumps(layout, pickle.HIGHEST_PROTOCOL))
+
+        assert_that(unpickled, instance_of(SubLayout))
+        assert_that(unpickled.astuple(), is_(LAYOUT.astuple()))
+
+    def test_packs_into_fixed_width_string(self):
+        assert_that(len(LAYOUT.pack()), is_(TagLayout.packer.size))
+
+    def test_can_be_unpacked(self):
+        assert_that(TagLayout.unpack(LAYOUT.pack()), is_(LAYOUT))
+
+
+class TestTaggedFileLayout(object):
+    def test_tagged_file_parses_layout(self):
+        tagged = TaggedFile(StringIO(FILE))
+
+        assert_that(tagged.layout, is_(LAYOUT))
+
+    def test_tagged_file_uses_given_layout(self):
+        layout = TagLayout(len(FILE))
+
+        tagged = TaggedFile(StringIO(FILE), layout=layout)
+
+        assert_that(tagged.music_limits, is_((0, len(FILE))))